@@ -5,7 +5,11 @@ Script para DESCUBRIR y LISTAR todos los canales disponibles en la fuente.
 """
 
 import requests
+import sys
 from collections import defaultdict
+from pathlib import Path
+
+from m3u_core import EXTINF_ATTR, parse_m3u
 
 SOURCE_URL = "https://iptv-org.github.io/iptv/countries/es.m3u"
 
@@ -15,37 +19,18 @@ def fetch_source_playlist():
     try:
         response = requests.get(SOURCE_URL, timeout=10)
         response.raise_for_status()
-        return response.text
+        return response.content
     except requests.RequestException as e:
         print(f"❌ Error: {e}")
         return None
 
-def parse_m3u(content):
+def parse_channels(content):
     """Parsea el contenido M3U y extrae metadatos."""
     channels = []
-    lines = content.split('\n')
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        if line.startswith('#EXTINF'):
-            extinf_line = line
-            if i + 1 < len(lines):
-                url_line = lines[i + 1].strip()
-                if url_line and url_line.startswith('http'):
-                    # Extraer metadatos
-                    channel_data = parse_extinf(extinf_line)
-                    channel_data['url'] = url_line
-                    channels.append(channel_data)
-                    i += 2
-                else:
-                    i += 1
-            else:
-                i += 1
-        else:
-            i += 1
-    
+    for channel in parse_m3u(content.split(b'\n')):
+        channel_data = parse_extinf(channel['extinf'])
+        channel_data['url'] = channel['url']
+        channels.append(channel_data)
     return channels
 
 def parse_extinf(extinf_line):
@@ -59,25 +44,18 @@ def parse_extinf(extinf_line):
     }
     
     # Extraer nombre (después de la última coma)
-    if ',' in extinf_line:
-        data['name'] = extinf_line.split(',', 1)[1].strip()
+    _, sep, name = extinf_line.partition(',')
+    if sep:
+        data['name'] = name.strip()
     
-    # Extraer atributos (regex opcional, pero aquí usamos split simple)
+    # Extraer atributos en una sola pasada (todo lo anterior a la última coma)
     # Formato: tvg-id="..." tvg-name="..." group-title="..." logo="..."
-    if 'tvg-id=' in extinf_line:
-        start = extinf_line.find('tvg-id="') + len('tvg-id="')
-        end = extinf_line.find('"', start)
-        data['tvg_id'] = extinf_line[start:end]
-    
-    if 'tvg-name=' in extinf_line:
-        start = extinf_line.find('tvg-name="') + len('tvg-name="')
-        end = extinf_line.find('"', start)
-        data['tvg_name'] = extinf_line[start:end]
+    header_part = extinf_line.rpartition(',')[0] or extinf_line
+    attrs = dict(EXTINF_ATTR.findall(header_part))
     
-    if 'group-title=' in extinf_line:
-        start = extinf_line.find('group-title="') + len('group-title="')
-        end = extinf_line.find('"', start)
-        data['group'] = extinf_line[start:end]
+    data['tvg_id'] = attrs.get('tvg-id', '')
+    data['tvg_name'] = attrs.get('tvg-name', '')
+    data['group'] = attrs.get('group-title', '')
     
     return data
 
@@ -94,7 +72,7 @@ def main():
     
     # Parsear
     print("⏳ Analizando canales...\n")
-    channels = parse_m3u(source_content)
+    channels = parse_channels(source_content)
     print(f"📊 Total de canales encontrados: {len(channels)}\n")
     
     # Agrupar por categoría (group-title)
@@ -103,36 +81,44 @@ def main():
         group = ch['group'] if ch['group'] else 'Sin categoría'
         by_group[group].append(ch)
     
-    # Mostrar por grupo
-    for group in sorted(by_group.keys()):
-        print(f"\n{'='*80}")
-        print(f"📺 GRUPO: {group}")
-        print(f"{'='*80}")
-        print(f"{'# Nombre del Canal':<50} {'TVG-ID':<20}")
-        print("-" * 80)
+    # Ordenar grupos y canales una sola vez (se reutiliza para consola y fichero)
+    ordered_groups = [(group, sorted(chs, key=lambda x: x['name']))
+                      for group, chs in sorted(by_group.items())]
+    
+    # Mostrar por grupo (tabla completa en una sola escritura)
+    rows = []
+    for group, group_channels in ordered_groups:
+        rows.append(f"\n{'='*80}")
+        rows.append(f"📺 GRUPO: {group}")
+        rows.append(f"{'='*80}")
+        rows.append(f"{'# Nombre del Canal':<50} {'TVG-ID':<20}")
+        rows.append("-" * 80)
         
-        for i, ch in enumerate(sorted(by_group[group], key=lambda x: x['name']), 1):
+        for i, ch in enumerate(group_channels, 1):
             name = ch['name'][:48]  # Truncar si es muy largo
             tvg_id = ch['tvg_id'][:18]
-            print(f"{i:2}. {name:<48} {tvg_id:<20}")
+            rows.append(f"{i:2}. {name:<48} {tvg_id:<20}")
+    sys.stdout.write('\n'.join(rows) + '\n')
     
     # Crear fichero de referencia
     output_file = "1.1-discovery_channels_result.txt"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write("CANALES DISPONIBLES EN ESPAÑA (iptv-org)\n")
-        f.write(f"Actualizado: 2026-01-04\n")
-        f.write(f"Total: {len(channels)} canales\n\n")
-        f.write("INSTRUCCIONES:\n")
-        f.write("1. Busca el canal que quieres en esta lista\n")
-        f.write("2. Copia el nombre EXACTO (columna 'Nombre del Canal')\n")
-        f.write("3. Pégalo en channels_list.txt\n\n")
-        
-        for group in sorted(by_group.keys()):
-            f.write(f"\n{'='*80}\n")
-            f.write(f"GRUPO: {group}\n")
-            f.write(f"{'='*80}\n")
-            for ch in sorted(by_group[group], key=lambda x: x['name']):
-                f.write(f"  • {ch['name']}\n")
+    out = []
+    out.append("CANALES DISPONIBLES EN ESPAÑA (iptv-org)\n")
+    out.append(f"Actualizado: 2026-01-04\n")
+    out.append(f"Total: {len(channels)} canales\n\n")
+    out.append("INSTRUCCIONES:\n")
+    out.append("1. Busca el canal que quieres en esta lista\n")
+    out.append("2. Copia el nombre EXACTO (columna 'Nombre del Canal')\n")
+    out.append("3. Pégalo en channels_list.txt\n\n")
+    
+    for group, group_channels in ordered_groups:
+        out.append(f"\n{'='*80}\n")
+        out.append(f"GRUPO: {group}\n")
+        out.append(f"{'='*80}\n")
+        for ch in group_channels:
+            out.append(f"  • {ch['name']}\n")
+    
+    Path(output_file).write_text(''.join(out), encoding='utf-8')
     
     print(f"\n\n✅ Lista de referencia guardada en: {output_file}")
     print(f"📖 Abre este fichero para copiar nombres exactos a channels_list.txt\n")
@@ -13,9 +13,17 @@ Características:
 """
 
 import requests
-import re
+import sys
 from datetime import datetime
 
+from m3u_core import (
+    EXTINF_ATTR,
+    build_channel_index,
+    clean_channel_name,
+    find_channel,
+    parse_m3u,
+)
+
 
 # ============================================================================
 # CONFIGURACIÓN
@@ -38,6 +46,13 @@ ADD_NUMERIC_PREFIX = True
 # True = "La 1", False = "La 1 (720p)"
 CLEAN_CHANNEL_NAMES = True
 
+# Sesión HTTP reutilizable (keep-alive + compresión gzip)
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    'Accept-Encoding': 'gzip, deflate',
+    'User-Agent': 'tv-tdt/1.0'
+})
+
 
 # ============================================================================
 # FUNCIONES
@@ -62,86 +77,20 @@ def load_wanted_channels():
 
 
 def fetch_source_playlist():
-    """Descarga la lista oficial de España."""
+    """
+    Abre la descarga de la lista oficial de España en modo streaming.
+    Retorna la respuesta para ir parseando las líneas según llegan.
+    """
     print(f"📥 Descargando lista desde: {SOURCE_URL}")
     try:
-        response = requests.get(SOURCE_URL, timeout=15)
+        response = _SESSION.get(SOURCE_URL, stream=True, timeout=15)
         response.raise_for_status()
-        print("✅ Lista descargada correctamente\n")
-        return response.text
+        return response
     except requests.RequestException as e:
         print(f"❌ Error al descargar: {e}\n")
         return None
 
 
-def parse_m3u(content):
-    """Parsea el contenido M3U y retorna lista de canales."""
-    channels = []
-    lines = content.split('\n')
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        if line.startswith('#EXTINF'):
-            extinf_line = line
-            if i + 1 < len(lines):
-                url_line = lines[i + 1].strip()
-                if url_line and url_line.startswith('http'):
-                    channels.append({
-                        'extinf': extinf_line,
-                        'url': url_line,
-                        'name': extract_channel_name(extinf_line)
-                    })
-                    i += 2
-                else:
-                    i += 1
-            else:
-                i += 1
-        else:
-            i += 1
-    
-    return channels
-
-
-def extract_channel_name(extinf_line):
-    """Extrae el nombre del canal de la línea EXTINF."""
-    if ',' in extinf_line:
-        name = extinf_line.split(',', 1)[1].strip()
-        return name
-    return ""
-
-
-def clean_channel_name(channel_name):
-    """
-    Limpia el nombre del canal eliminando resoluciones y etiquetas.
-    
-    Ejemplos:
-    - "La 1 (720p)" → "La 1"
-    - "Antena 3 (1080p)" → "Antena 3"
-    - "Tele Safor (720p) [Not 24/7]" → "Tele Safor"
-    - "La 1 UHD (2160p)" → "La 1 UHD"
-    """
-    if not CLEAN_CHANNEL_NAMES:
-        return channel_name
-    
-    # Eliminar patrones comunes:
-    # - (720p), (1080p), (2160p), (576p), (1280p), etc.
-    # - [Not 24/7], [Geo-blocked], etc.
-    # - Espacios extra
-    
-    # Eliminar resoluciones entre paréntesis
-    cleaned = re.sub(r'\s*\(\d+p\)', '', channel_name)
-    
-    # Eliminar etiquetas entre corchetes
-    cleaned = re.sub(r'\s*\[.*?\]', '', cleaned)
-    
-    # Eliminar espacios extra y trimear
-    cleaned = ' '.join(cleaned.split())
-    
-    return cleaned.strip()
-
-
 def clean_url(url):
     """
     Limpia la URL para asegurar formato correcto M3U.
@@ -155,72 +104,10 @@ def clean_url(url):
     return url
 
 
-def add_channel_number_to_extinf(extinf_line, channel_number):
-    """
-    Agrega tvg-chno (número de canal) a la línea EXTINF.
-    El atributo tvg-chno es reconocido por apps IPTV para ordenar canales.
-    """
-    # Buscar si ya existe tvg-chno y eliminarlo
-    extinf_line = re.sub(r'tvg-chno="[^"]*"\s*', '', extinf_line)
-    
-    # Insertar tvg-chno justo después de #EXTINF:-1
-    if extinf_line.startswith('#EXTINF:-1'):
-        extinf_line = extinf_line.replace(
-            '#EXTINF:-1 ',
-            f'#EXTINF:-1 tvg-chno="{channel_number}" ',
-            1
-        )
-        if '#EXTINF:-1 tvg-chno=' not in extinf_line:
-            extinf_line = extinf_line.replace(
-                '#EXTINF:-1',
-                f'#EXTINF:-1 tvg-chno="{channel_number}" ',
-                1
-            )
-    
-    return extinf_line
-
-
-def add_channel_prefix_to_name(extinf_line, channel_number):
-    """
-    Agrega número de canal al principio del nombre para forzar orden alfabético.
-    Ej: "La 1" → "001. La 1"
-    
-    Esto garantiza que incluso si la app ordena alfabéticamente,
-    los canales aparezcan en el orden correcto.
-    """
-    if not ADD_NUMERIC_PREFIX:
-        return extinf_line
-    
-    if ',' in extinf_line:
-        parts = extinf_line.split(',', 1)
-        channel_name = parts[1].strip()
-        # Agregar prefijo con padding de 3 dígitos (soporta hasta 999 canales)
-        new_name = f"{channel_number:03d}. {channel_name}"
-        extinf_line = f"{parts[0]},{new_name}"
-    
-    return extinf_line
-
-
-def clean_extinf_channel_name(extinf_line):
-    """
-    Limpia el nombre del canal dentro de la línea EXTINF.
-    Elimina resoluciones y etiquetas del nombre después de la coma.
+def get_group_title(channel_number, original_group=None, mode=None, custom_name=None):
     """
-    if not CLEAN_CHANNEL_NAMES:
-        return extinf_line
-    
-    if ',' in extinf_line:
-        parts = extinf_line.split(',', 1)
-        channel_name = parts[1].strip()
-        cleaned_name = clean_channel_name(channel_name)
-        extinf_line = f"{parts[0]},{cleaned_name}"
-    
-    return extinf_line
-
-
-def normalize_group_title(extinf_line, channel_number=None, mode=None, custom_name=None):
-    """
-    Normaliza el group-title según configuración.
+    Determina el group-title según configuración.
+    Retorna None si el canal debe quedar sin group-title.
     
     Modos:
     - "unique": Todos los canales en un grupo
@@ -234,114 +121,99 @@ def normalize_group_title(extinf_line, channel_number=None, mode=None, custom_na
         custom_name = UNIQUE_GROUP_NAME
     
     if mode == "original":
-        return extinf_line
+        return original_group
     
     if mode == "none":
-        return re.sub(r'group-title="[^"]*"\s*', '', extinf_line)
-    
-    # Eliminar group-title existente
-    extinf_line = re.sub(r'group-title="[^"]*"\s*', '', extinf_line)
+        return None
     
-    # Determinar nuevo group-title
-    if mode == "unique":
-        new_group = custom_name
-    elif mode == "custom":
+    if mode == "custom":
         # Grupos personalizados según numeración
         if channel_number <= 8:
-            new_group = "Nacionales"
+            return "Nacionales"
         elif channel_number <= 18:
-            new_group = "Entretenimiento"
+            return "Entretenimiento"
         elif channel_number <= 33:
-            new_group = "Autonómicos"
-        else:
-            new_group = "Temáticos"
-    else:
-        new_group = custom_name
+            return "Autonómicos"
+        return "Temáticos"
     
-    # Agregar nuevo group-title
-    if ',' in extinf_line:
-        parts = extinf_line.split(',', 1)
-        extinf_line = f'{parts[0]} group-title="{new_group}",{parts[1]}'
-    
-    return extinf_line
+    return custom_name
 
 
-def match_channel_strict(available_name, wanted_name):
-    """
-    Intenta hacer matching de forma inteligente:
-    1. Primero match exacto
-    2. Luego case-insensitive
-    3. Luego búsqueda parcial (ignorando resoluciones)
+def format_extinf(channel_data, channel_number):
     """
-    avail = available_name.strip()
-    want = wanted_name.strip()
+    Genera la línea EXTINF final en una sola pasada:
+    1. Número de canal (tvg-chno, reconocido por apps IPTV para ordenar)
+    2. Nombre limpio (sin resoluciones ni etiquetas)
+    3. Prefijo numérico en el nombre ("001. La 1") para forzar orden alfabético
+    4. group-title normalizado
     
-    # Match exacto
-    if avail == want:
-        return True
-    
-    # Case-insensitive
-    if avail.lower() == want.lower():
-        return True
+    Los atributos originales (tvg-id, tvg-logo...) se conservan en su orden.
+    """
+    extinf_line = channel_data['extinf']
     
-    # Búsqueda parcial
-    if want.lower() in avail.lower():
-        return True
+    # Parsear atributos y nombre (tras la coma que sigue al último atributo)
+    attrs = {}
+    attrs_end = 0
+    for match in EXTINF_ATTR.finditer(extinf_line):
+        attrs[match.group(1)] = match.group(2)
+        attrs_end = match.end()
+    channel_name = extinf_line[attrs_end:].partition(',')[2].strip()
     
-    # Búsqueda inversa
-    if avail.lower() in want.lower():
-        return True
+    attrs.pop('tvg-chno', None)
+    group = get_group_title(channel_number, attrs.pop('group-title', None))
     
-    # Matching sin resoluciones (más flexible)
-    avail_clean = clean_channel_name(avail).lower()
-    want_clean = clean_channel_name(want).lower()
+    if CLEAN_CHANNEL_NAMES:
+        channel_name = clean_channel_name(channel_name)
+    if ADD_NUMERIC_PREFIX:
+        # Padding de 3 dígitos (soporta hasta 999 canales)
+        channel_name = f"{channel_number:03d}. {channel_name}"
     
-    if avail_clean == want_clean:
-        return True
+    fields = [f'tvg-chno="{channel_number}"']
+    fields.extend(f'{key}="{value}"' for key, value in attrs.items())
+    if group is not None:
+        fields.append(f'group-title="{group}"')
     
-    return False
+    return f"#EXTINF:-1 {' '.join(fields)},{channel_name}"
 
 
 def build_custom_playlist(all_channels, wanted_channels):
     """
     Construye la playlist personalizada con numeración TDT.
     El orden en channels_list.txt determina el número de canal.
+    Retorna (contenido, número de URLs en la playlist).
     """
     playlist_lines = ["#EXTM3U"]
     found_channels = {}
     debug_matches = []
+    rows = []
     
     print(f"🔍 Buscando {len(wanted_channels)} canales solicitados...\n")
     print(f"{'Nº':<4} {'Buscado':<40} {'Encontrado':<50} {'Estado':<15}")
     print("-" * 115)
     
     # Primer paso: mapear canales encontrados con numeración
+    channel_index = build_channel_index(all_channels)
+    
     for idx, wanted in enumerate(wanted_channels, start=1):
-        best_match = None
-        best_match_data = None
-        
-        for channel_data in all_channels:
-            channel_name = channel_data['name']
-            
-            if match_channel_strict(channel_name, wanted):
-                # Si hay múltiples matches, prefiere el más corto (más específico)
-                if best_match is None or len(channel_name) < len(best_match):
-                    best_match = channel_name
-                    best_match_data = channel_data
+        best_match_data = find_channel(wanted, channel_index)
         
         if best_match_data:
+            best_match = best_match_data['name']
             found_channels[wanted] = {
                 'data': best_match_data,
                 'number': idx
             }
             status = "✅ OK"
-            print(f"{idx:<4} {wanted:<40} {best_match:<50} {status:<15}")
+            rows.append(f"{idx:<4} {wanted:<40} {best_match:<50} {status:<15}")
             debug_matches.append(f"Canal {idx}: ✅ '{wanted}' -> '{best_match}'")
         else:
             status = "❌ NO ENCONTRADO"
-            print(f"{idx:<4} {wanted:<40} {'-':<50} {status:<15}")
+            rows.append(f"{idx:<4} {wanted:<40} {'-':<50} {status:<15}")
             debug_matches.append(f"Canal {idx}: ❌ '{wanted}' -> NO ENCONTRADO")
     
+    # Tabla de resultados en una sola escritura
+    sys.stdout.write('\n'.join(rows) + '\n')
+    
     # Segundo paso: escribir en orden con todas las transformaciones
     print(f"\n" + "=" * 115)
     print(f"✅ Canales encontrados: {len(found_channels)}/{len(wanted_channels)}")
@@ -353,29 +225,8 @@ def build_custom_playlist(all_channels, wanted_channels):
             channel_data = channel_info['data']
             channel_number = channel_info['number']
             
-            # 1. Agregar número de canal (tvg-chno)
-            extinf_with_number = add_channel_number_to_extinf(
-                channel_data['extinf'],
-                channel_number
-            )
-            
-            # 2. Limpiar nombre del canal (eliminar resoluciones)
-            extinf_cleaned = clean_extinf_channel_name(extinf_with_number)
-            
-            # 3. Agregar prefijo numérico al nombre (001., 002., etc.)
-            extinf_with_prefix = add_channel_prefix_to_name(
-                extinf_cleaned,
-                channel_number
-            )
-            
-            # 4. Normalizar group-title
-            extinf_final = normalize_group_title(
-                extinf_with_prefix,
-                channel_number
-            )
-            
-            # 5. Agregar línea EXTINF y URL limpia
-            playlist_lines.append(extinf_final)
+            # Línea EXTINF (número, nombre limpio, prefijo y group-title) y URL limpia
+            playlist_lines.append(format_extinf(channel_data, channel_number))
             clean_channel_url = clean_url(channel_data['url'])
             playlist_lines.append(clean_channel_url)
     
@@ -388,23 +239,23 @@ def build_custom_playlist(all_channels, wanted_channels):
         f.write(f"  - ADD_NUMERIC_PREFIX: {ADD_NUMERIC_PREFIX}\n")
         f.write(f"  - CLEAN_CHANNEL_NAMES: {CLEAN_CHANNEL_NAMES}\n")
         f.write("=" * 70 + "\n\n")
-        for line in debug_matches:
-            f.write(line + "\n")
+        f.write('\n'.join(debug_matches))
+        f.write('\n')
         f.write("\n" + "=" * 70 + "\n")
         f.write(f"💡 El orden en {CHANNELS_FILE} determina la numeración\n")
         f.write(f"   Canal 1 = primera línea, Canal 2 = segunda línea, etc.\n")
     
-    return '\n'.join(playlist_lines)
+    url_count = sum(1 for line in playlist_lines if line.startswith('http'))
+    
+    return '\n'.join(playlist_lines), url_count
 
 
-def save_playlist(content):
+def save_playlist(content, url_count):
     """Guarda la playlist en fichero."""
     try:
         with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
             f.write(content)
         
-        url_count = content.count('http')
-        
         print(f"📁 Playlist guardada: {OUTPUT_FILE}")
         print(f"📊 Canales en la playlist: {url_count}")
         print(f"\n📺 CONFIGURACIÓN:")
@@ -442,19 +293,26 @@ def main():
     print(f"🧹 Limpiar nombres: {'ACTIVADO' if CLEAN_CHANNEL_NAMES else 'DESACTIVADO'}\n")
     
     # 2. Descargar fuente
-    source_content = fetch_source_playlist()
-    if not source_content:
+    response = fetch_source_playlist()
+    if response is None:
         return
     
-    # 3. Parsear
-    all_channels = parse_m3u(source_content)
+    # 3. Parsear (mientras se descarga)
+    try:
+        all_channels = list(parse_m3u(response.iter_lines()))
+    except requests.RequestException as e:
+        print(f"❌ Error al descargar: {e}\n")
+        return
+    finally:
+        response.close()
+    print("✅ Lista descargada correctamente\n")
     print(f"📊 Canales totales en fuente: {len(all_channels)}\n")
     
     # 4. Filtrar, ordenar y numerar
-    custom_playlist = build_custom_playlist(all_channels, wanted_channels)
+    custom_playlist, url_count = build_custom_playlist(all_channels, wanted_channels)
     
     # 5. Guardar
-    if save_playlist(custom_playlist):
+    if save_playlist(custom_playlist, url_count):
         print("=" * 115)
         print("✅ PROCESO COMPLETADO - LISTA TDT LIMPIA Y NUMERADA")
         print("=" * 115)
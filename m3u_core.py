@@ -0,0 +1,191 @@
+"""
+Funciones comunes para parsear listas M3U y hacer matching de canales.
+Compartidas por 1-discovery_channels.py y 3-build_playlist.py.
+"""
+
+import re
+from functools import lru_cache
+
+
+# ============================================================================
+# PATRONES
+# ============================================================================
+# Atributos EXTINF: clave="valor"
+EXTINF_ATTR = re.compile(r'([\w-]+)="([^"]*)"')
+
+# Limpieza de nombres (precompilados, se reutilizan en cada canal)
+_CLEAN_ALL = re.compile(r'\s*\(\d+p\)|\s*\[[^\]]*\]')
+_WS = re.compile(r'\s{2,}')
+
+
+# ============================================================================
+# PARSEO
+# ============================================================================
+
+def parse_m3u(lines):
+    """
+    Parsea líneas M3U (bytes) y genera los canales según se van leyendo.
+    La URL es la primera línea que empieza por http:// o https:// tras cada #EXTINF.
+    
+    Solo se decodifican a texto las líneas EXTINF y URL de cada canal;
+    el resto de la lista no llega a decodificarse.
+    """
+    extinf_line = None
+    
+    for line in lines:
+        if line[:7] == b'#EXTINF':
+            extinf_line = line
+        elif extinf_line is not None and line.startswith((b'http://', b'https://')):
+            extinf_text = extinf_line.decode('utf-8', 'replace').strip()
+            yield {
+                'extinf': extinf_text,
+                'url': line.decode('utf-8', 'replace').strip(),
+                'name': extract_channel_name(extinf_text)
+            }
+            extinf_line = None
+
+
+def extract_channel_name(extinf_line):
+    """Extrae el nombre del canal de la línea EXTINF."""
+    _, sep, name = extinf_line.partition(',')
+    if sep:
+        return name.strip()
+    return ""
+
+
+@lru_cache(maxsize=4096)
+def clean_channel_name(channel_name):
+    """
+    Limpia el nombre del canal eliminando resoluciones y etiquetas.
+    Memorizada: los mismos nombres se limpian muchas veces al hacer matching.
+    
+    Ejemplos:
+    - "La 1 (720p)" → "La 1"
+    - "Antena 3 (1080p)" → "Antena 3"
+    - "Tele Safor (720p) [Not 24/7]" → "Tele Safor"
+    - "La 1 UHD (2160p)" → "La 1 UHD"
+    """
+    # Eliminar patrones comunes:
+    # - (720p), (1080p), (2160p), (576p), (1280p), etc.
+    # - [Not 24/7], [Geo-blocked], etc.
+    # - Espacios extra
+    
+    # Eliminar resoluciones entre paréntesis y etiquetas entre corchetes (una pasada)
+    cleaned = channel_name
+    if '(' in cleaned or '[' in cleaned:
+        cleaned = _CLEAN_ALL.sub('', cleaned)
+    cleaned = cleaned.strip()
+    
+    # Eliminar espacios extra internos
+    if '  ' in cleaned:
+        cleaned = _WS.sub(' ', cleaned)
+    
+    return cleaned
+
+
+# ============================================================================
+# MATCHING
+# ============================================================================
+
+def channel_keys(channel_name):
+    """
+    Precalcula las claves de comparación de un nombre de canal:
+    (nombre, nombre en minúsculas, nombre limpio en minúsculas).
+    """
+    name = channel_name.strip()
+    return name, name.lower(), clean_channel_name(name).lower()
+
+
+def match_channel_strict(avail, avail_lower, avail_clean, want, want_lower, want_clean):
+    """
+    Intenta hacer matching de forma inteligente:
+    1. Primero match exacto
+    2. Luego case-insensitive
+    3. Luego búsqueda parcial (ignorando resoluciones)
+    
+    Recibe las claves ya precalculadas por channel_keys() para el canal
+    disponible y el deseado (las del deseado se calculan una sola vez).
+    """
+    # Match exacto
+    if avail == want:
+        return True
+    
+    # Case-insensitive
+    if avail_lower == want_lower:
+        return True
+    
+    # Búsqueda parcial
+    if want_lower in avail_lower:
+        return True
+    
+    # Búsqueda inversa
+    if avail_lower in want_lower:
+        return True
+    
+    # Matching sin resoluciones (más flexible)
+    if avail_clean == want_clean:
+        return True
+    
+    return False
+
+
+def build_channel_index(all_channels):
+    """
+    Construye índices para resolver los canales deseados con búsquedas
+    en diccionario en lugar de recorrer toda la fuente por cada canal.
+    
+    Retorna (exacto, minúsculas, limpio, claves). En el índice limpio se
+    guarda el candidato de nombre más corto (más específico); claves es la
+    lista de (canal, channel_keys) para la búsqueda parcial.
+    """
+    exact = {}
+    lower = {}
+    cleaned = {}
+    keyed = []
+    
+    for channel_data in all_channels:
+        keys = channel_keys(channel_data['name'])
+        channel_name, name_lower, name_clean = keys
+        keyed.append((channel_data, keys))
+        
+        exact.setdefault(channel_name, channel_data)
+        lower.setdefault(name_lower, channel_data)
+        
+        current = cleaned.get(name_clean)
+        if current is None or len(channel_name) < len(current['name']):
+            cleaned[name_clean] = channel_data
+    
+    return exact, lower, cleaned, keyed
+
+
+def find_channel(wanted, channel_index):
+    """
+    Busca un canal deseado:
+    1. En los índices (exacto, case-insensitive, sin resoluciones)
+    2. Si no aparece, recorre la fuente con búsqueda parcial
+    """
+    exact, lower, cleaned, keyed = channel_index
+    want, want_lower, want_clean = channel_keys(wanted)
+    
+    match = exact.get(want)
+    if match is None:
+        match = lower.get(want_lower)
+    if match is None:
+        match = cleaned.get(want_clean)
+    if match is not None:
+        return match
+    
+    # Búsqueda parcial: si hay múltiples matches, prefiere el más corto (más específico).
+    # Un match exacto ya habría salido por el índice, así que solo se comparan
+    # candidatos más cortos que el mejor encontrado hasta ahora.
+    best_match_data = None
+    best_len = None
+    for channel_data, (avail, avail_lower, avail_clean) in keyed:
+        if best_len is not None and len(avail) >= best_len:
+            continue
+        if match_channel_strict(avail, avail_lower, avail_clean,
+                                want, want_lower, want_clean):
+            best_match_data = channel_data
+            best_len = len(avail)
+    
+    return best_match_data